@@ -1,91 +1,316 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
 import requests
-import plotly.express as px
-import plotly.graph_objs as go
+import ijson
+import logging
+import urllib3
+import os
 import time
+import threading
+from pathlib import Path
+from plotly.colors import qualitative
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
-# Enhanced data fetching with comprehensive error handling and retry mechanism
-def get_crypto_data(current_price):
-    def requests_retry_session(
-        retries=3,
-        backoff_factor=0.3,
-        status_forcelist=(500, 502, 504, 429)
-    ):
-        retry = Retry(
-            total=retries,
-            read=retries,
-            connect=retries,
-            backoff_factor=backoff_factor,
-            status_forcelist=status_forcelist,
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        session = requests.Session()
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        return session
+# Currencies offered in the sidebar; all of them are prefetched in the background
+CURRENCIES = ['usd', 'btc', 'inr', 'eth', 'eur', 'jpy']
+
+# Number of coins requested from CoinGecko; also the upper bound of the "Top N" slider
+MAX_COINS = 100
+
+# CoinGecko fields used by the table and charts; everything else is dropped at parse time
+USED_COLUMNS = [
+    "id",
+    "name",
+    "current_price",
+    "market_cap",
+    "total_volume",
+    "price_change_percentage_24h"
+]
+
+# Raised when CoinGecko answers 200 but the body is not a non-empty list of coins,
+# e.g. its {"status": {...}} error object
+class EmptyMarketDataError(Exception):
+    pass
+
+# Errors a market data fetch can raise: network/HTTP failures, errors while
+# streaming the raw body (not wrapped by requests), malformed JSON and empty payloads
+FETCH_ERRORS = (
+    requests.exceptions.RequestException,
+    urllib3.exceptions.HTTPError,
+    ijson.JSONError,
+    EmptyMarketDataError
+)
+
+# Last successful response per currency, kept on disk to ride out rate limits and restarts
+CACHE_DIR = Path(__file__).parent / ".crypto_cache"
+
+# Minimum spacing in seconds between CoinGecko requests
+MIN_REQUEST_INTERVAL = 1.0
+
+# Seconds between background refreshes of the prefetched market data
+REFRESH_INTERVAL = 60
+
+# Age in seconds after which prefetched data is no longer served without a fresh fetch
+STALE_AFTER = 2 * REFRESH_INTERVAL
+
+# Timeout in seconds for a CoinGecko request; also the longest a first render
+# waits for the refresh thread before fetching on its own
+REQUEST_TIMEOUT = 10
+
+# Name of the background refresh thread, used to find and stop a previous one
+REFRESH_THREAD_NAME = "crypto-market-refresh"
+
+logger = logging.getLogger(__name__)
+
+# Retry-enabled session, created once per process and reused across reruns.
+# Only call this from the script thread: without a ScriptRunContext cache_resource
+# neither reads nor writes its cache, so the refresh thread is handed the session instead.
+@st.cache_resource(show_spinner=False)
+def requests_retry_session(
+    retries=3,
+    backoff_factor=0.3,
+    status_forcelist=(500, 502, 504, 429)
+):
+    retry = Retry(
+        total=retries,
+        read=retries,
+        connect=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+    )
+    # Shared by the refresh thread and foreground fetches from every session
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=10)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+# Time of the last CoinGecko request, shared across reruns, sessions and the refresh thread.
+# Like the session, it is created in the script thread and handed to the refresh thread.
+@st.cache_resource(show_spinner=False)
+def last_request_time():
+    return [0.0], threading.Lock()
+
+# Sleep only as long as needed to keep requests MIN_REQUEST_INTERVAL apart;
+# the first request after an idle period goes out immediately
+def wait_for_rate_limit(limiter):
+    last, lock = limiter
+    with lock:
+        now = time.monotonic()
+        wait = max(0.0, MIN_REQUEST_INTERVAL - (now - last[0]))
+        last[0] = now + wait
+    if wait:
+        time.sleep(wait)
+
+# Persist a successful response; written to a temp file first so readers never see a partial file
+def save_last_good(current_price, df):
+    # Never let an empty frame replace a good one
+    if df.empty:
+        return
+
+    path = CACHE_DIR / f"{current_price}.parquet"
+    tmp_path = CACHE_DIR / f"{current_price}.{threading.get_ident()}.tmp"
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError, TypeError):
+        # The disk cache is best effort; never fail a fetch because of it
+        # (pyarrow raises ArrowInvalid/ArrowTypeError, subclasses of ValueError/TypeError)
+        tmp_path.unlink(missing_ok=True)
 
+# Last persisted response for a currency, or None if there is none
+def load_last_good(current_price):
     try:
-        # Create a retry-enabled session
-        session = requests_retry_session()
-        
-        url = "https://api.coingecko.com/api/v3/coins/markets"
-        params = {
-            "vs_currency": current_price,
-            "order": "market_cap_desc",
-            "per_page": 100,
-            "page": 1,
-            "sparkline": False
-        }
-        
-        # Add delay to prevent rate limiting
-        time.sleep(1)
-        
-        # Make the request with longer timeout
-        response = session.get(url, params=params, timeout=10)
-        
+        return pd.read_parquet(CACHE_DIR / f"{current_price}.parquet")
+    except (OSError, ValueError):
+        return None
+
+# Raw market data request for a single currency
+def request_crypto_data(current_price: str, session, limiter) -> pd.DataFrame:
+    url = "https://api.coingecko.com/api/v3/coins/markets"
+    # Keep the payload minimal: no sparkline arrays and no extra
+    # price_change_percentage_<window> fields (the 24h change is always included)
+    params = {
+        "vs_currency": current_price,
+        "order": "market_cap_desc",
+        "per_page": MAX_COINS,
+        "page": 1,
+        "sparkline": False
+    }
+
+    # Space out requests to prevent rate limiting
+    wait_for_rate_limit(limiter)
+
+    # Make the request with longer timeout, streaming the body
+    with session.get(url, params=params, timeout=REQUEST_TIMEOUT, stream=True) as response:
         # Raise exception for bad responses
         response.raise_for_status()
-        
-        # Parse and return data
-        data = response.json()
-        return pd.DataFrame(data)
-    
-    except requests.exceptions.RequestException as e:
-        # Detailed error handling
-        if isinstance(e, requests.exceptions.HTTPError):
-            if e.response.status_code == 429:
-                st.error("""
-                ### 🚨 Rate Limit Exceeded
-                You've hit the CoinGecko API rate limit. Solutions:
-                - Wait a few minutes before refreshing
-                - Use a different API or get a pro API key
-                - Reduce the number of requests
-                """)
-            else:
-                st.error(f"HTTP Error: {e}")
-        elif isinstance(e, requests.exceptions.ConnectionError):
-            st.error("""
-            ### 🌐 Connection Error
-            - Unable to connect to CoinGecko API
-            - Check your internet connection
-            - The service might be temporarily unavailable
-            """)
-        elif isinstance(e, requests.exceptions.Timeout):
+
+        # Stream-parse the coins one at a time and keep only the columns we use,
+        # so the full list of ~25-field dicts is never held in memory
+        response.raw.decode_content = True
+        rows = [
+            tuple(coin.get(column) for column in USED_COLUMNS)
+            for coin in ijson.items(response.raw, "item", use_float=True)
+        ]
+
+    # A non-list body (such as an error object) yields no items; treat it as a failure
+    if not rows:
+        raise EmptyMarketDataError(f"CoinGecko returned no market data for {current_price}")
+
+    df = pd.DataFrame(rows, columns=USED_COLUMNS)
+    save_last_good(current_price, df)
+    return df
+
+# Cached market data fetch; exceptions are not cached, so failures retry on the next rerun
+@st.cache_data(ttl=60, show_spinner="Fetching crypto prices…")
+def fetch_crypto_data(current_price: str) -> pd.DataFrame:
+    return request_crypto_data(current_price, requests_retry_session(), last_request_time())
+
+# Fetch one currency in the background and publish it with its fetch time. Every
+# exception is caught here so a bad response can never kill the refresh thread.
+def refresh_currency(store, currency, session, limiter):
+    try:
+        df = request_crypto_data(currency, session, limiter)
+        error = None
+    except FETCH_ERRORS as e:
+        logger.warning("Background refresh of %s failed: %s", currency, e)
+        df, error = None, e
+    except Exception as e:
+        logger.exception("Unexpected error during background refresh of %s", currency)
+        df, error = None, e
+
+    with store["condition"]:
+        if df is not None:
+            store["latest"][currency] = (time.monotonic(), df)
+            store["errors"].pop(currency, None)
+        else:
+            store["errors"][currency] = error
+        store["attempted"].add(currency)
+        store["condition"].notify_all()
+
+# Background loop keeping the latest market data for every currency warm. Currencies
+# are fetched one at a time, so the pass only books a rate limiter slot when it is
+# about to send and a foreground fetch never queues behind a batch of reservations.
+def refresh_crypto_data(store, session, limiter):
+    stop = store["stop"]
+    while not stop.is_set():
+        for currency in CURRENCIES:
+            if stop.is_set():
+                return
+            refresh_currency(store, currency, session, limiter)
+        stop.wait(REFRESH_INTERVAL)
+
+# Start the refresh thread once per process; reruns and sessions share its results.
+# Module globals are re-executed on every rerun, so the state lives in st.cache_resource.
+# The session and limiter are created here, in the script thread, and handed over.
+@st.cache_resource(show_spinner=False)
+def start_background_refresh():
+    # Clearing the cache or editing this function re-runs it; stop the previous
+    # generation's thread so only one refresh loop ever talks to CoinGecko
+    for thread in threading.enumerate():
+        if thread.name == REFRESH_THREAD_NAME:
+            thread.stop_event.set()
+
+    store = {
+        "latest": {},          # currency -> (fetch time, DataFrame)
+        "attempted": set(),    # currencies the thread has tried at least once
+        "errors": {},          # currency -> error from the thread's latest failed attempt
+        "condition": threading.Condition(),
+        "stop": threading.Event()
+    }
+    session = requests_retry_session()
+    limiter = last_request_time()
+    thread = threading.Thread(
+        target=refresh_crypto_data,
+        args=(store, session, limiter),
+        name=REFRESH_THREAD_NAME,
+        daemon=True
+    )
+    thread.stop_event = store["stop"]
+    thread.start()
+    return store
+
+# Detailed error reporting for a failed market data fetch
+def show_fetch_error(e):
+    if isinstance(e, requests.exceptions.HTTPError):
+        if e.response.status_code == 429:
             st.error("""
-            ### ⏰ Request Timeout
-            - The request to CoinGecko took too long
-            - Try again later or check your internet speed
+            ### 🚨 Rate Limit Exceeded
+            You've hit the CoinGecko API rate limit. Solutions:
+            - Wait a few minutes before refreshing
+            - Use a different API or get a pro API key
+            - Reduce the number of requests
             """)
         else:
-            st.error(f"Unexpected error occurred: {e}")
-        
-        return pd.DataFrame()
+            st.error(f"HTTP Error: {e}")
+    elif isinstance(e, requests.exceptions.ConnectionError):
+        st.error("""
+        ### 🌐 Connection Error
+        - Unable to connect to CoinGecko API
+        - Check your internet connection
+        - The service might be temporarily unavailable
+        """)
+    elif isinstance(e, requests.exceptions.Timeout):
+        st.error("""
+        ### ⏰ Request Timeout
+        - The request to CoinGecko took too long
+        - Try again later or check your internet speed
+        """)
+    else:
+        st.error(f"Unexpected error occurred: {e}")
+
+# Enhanced data fetching with comprehensive error handling and retry mechanism
+def get_crypto_data(current_price):
+    store = start_background_refresh()
+    condition = store["condition"]
+
+    # On a cold start, wait for the refresh thread's attempt at this currency instead
+    # of sending a duplicate request, but no longer than a single request may take
+    with condition:
+        attempted = current_price in store["attempted"]
+    if not attempted:
+        with st.spinner("Fetching crypto prices…"), condition:
+            condition.wait_for(lambda: current_price in store["attempted"], timeout=REQUEST_TIMEOUT)
+
+    # Serve from the background prefetch while it is fresh; otherwise keep the
+    # old frame as a fallback
+    with condition:
+        entry = store["latest"].get(current_price)
+        error = store["errors"].get(current_price)
+    stale_df = None
+    if entry is not None:
+        fetched_at, df = entry
+        if time.monotonic() - fetched_at <= STALE_AFTER:
+            return df
+        stale_df = df
+
+    # If the refresh thread's latest attempt failed, report that rather than
+    # repeating the request; otherwise fetch in the foreground
+    if error is None:
+        try:
+            return fetch_crypto_data(current_price)
+        except FETCH_ERRORS as e:
+            error = e
 
-# Fallback data function
+    show_fetch_error(error)
+
+    # Serve the newest data still available before resorting to the fallback data
+    df = stale_df if stale_df is not None else load_last_good(current_price)
+    if df is not None:
+        st.info("Showing the last saved prices until CoinGecko is reachable again")
+        return df
+
+    return pd.DataFrame()
+
+# Fallback data function; built once per process and shared as-is, since
+# downstream code only filters and plots it and never mutates it
+@st.cache_resource(show_spinner=False)
 def get_fallback_crypto_data():
     fallback_data = {
         'name': ['Bitcoin', 'Ethereum', 'Tether', 'BNB', 'Solana'],
@@ -96,12 +321,104 @@ def get_fallback_crypto_data():
     }
     return pd.DataFrame(fallback_data)
 
+# Chart builder, cached per selection so reruns with unchanged filters skip Plotly
+# figure construction. st.cache_resource hands back the same figures without the
+# pickle round-trip (and re-validation) st.cache_data would do on every hit.
+@st.cache_resource(show_spinner=False, max_entries=50)
+def build_charts(df):
+    # Pull every column out once and feed plain arrays to graph objects,
+    # skipping plotly.express's per-figure DataFrame processing
+    names = df['name'].to_numpy()
+    price = df['current_price'].to_numpy()
+    market_cap = df['market_cap'].to_numpy()
+    volume = df['total_volume'].to_numpy()
+    change = df['price_change_percentage_24h'].to_numpy()
+
+    # Bar Chart
+    fig_bar = go.Figure(
+        go.Bar(x=names, y=price),
+        layout=go.Layout(
+            title='Current Price of Selected Cryptocurrencies',
+            xaxis_title='name',
+            yaxis_title='current_price'
+        )
+    )
+
+    # Line Chart
+    fig_line = go.Figure(
+        go.Scatter(x=names, y=market_cap, mode='lines'),
+        layout=go.Layout(
+            title='Market Cap of Selected Cryptocurrencies',
+            xaxis_title='name',
+            yaxis_title='market_cap'
+        )
+    )
+
+    # Histogram
+    fig_hist = go.Figure(
+        go.Histogram(x=names, y=volume, histfunc='sum'),
+        layout=go.Layout(
+            title='Total Volume of Selected Cryptocurrencies',
+            xaxis_title='name',
+            yaxis_title='sum of total_volume'
+        )
+    )
+
+    # Pie Chart, pulling out the three largest slices
+    fig_pie = go.Figure(
+        go.Pie(
+            labels=names,
+            values=market_cap,
+            textinfo='percent+label',
+            pull=np.where(np.arange(len(names)) < 3, 0.1, 0.0)
+        ),
+        layout=go.Layout(
+            title='Market Cap Distribution of Selected Cryptocurrencies',
+            piecolorway=qualitative.Pastel,
+            showlegend=True,
+            legend=dict(
+                title="Cryptocurrencies",
+                orientation="v",
+                yanchor="top",
+                y=1,
+                xanchor="left",
+                x=1.05
+            )
+        )
+    )
+
+    # Scatter Plot; marker area scales with market cap like px.scatter(size_max=60)
+    size_max = 60
+    sizeref = 2.0 * np.nanmax(market_cap) / size_max ** 2 if len(names) else 1
+    palette = qualitative.Plotly
+    fig_scatter = go.Figure(
+        go.Scatter(
+            x=names,
+            y=change,
+            mode='markers',
+            hovertext=names,
+            marker=dict(
+                size=market_cap,
+                sizemode='area',
+                sizeref=sizeref,
+                color=[palette[i % len(palette)] for i in range(len(names))]
+            )
+        ),
+        layout=go.Layout(
+            title='24h Price Change Percentage vs Market Cap',
+            xaxis_title='name',
+            yaxis_title='price_change_percentage_24h'
+        )
+    )
+
+    return fig_bar, fig_line, fig_hist, fig_pie, fig_scatter
+
 # Improved Streamlit configuration
 st.set_page_config(page_title="Crypto Price Tracker", layout="wide", page_icon=":chart_with_upwards_trend:")
 
 # Title and description
 st.title("🚀 Cryptocurrency Price Tracker")
-st.markdown("Real-time analysis of top 100 cryptocurrencies")
+st.markdown(f"Real-time analysis of top {MAX_COINS} cryptocurrencies")
 
 # Add a warning about potential API limitations
 st.warning("""
@@ -118,7 +435,7 @@ with st.sidebar:
     
     # Currency selection with more options
     current_price = st.selectbox('Select Price Currency', 
-        ['usd', 'btc', 'inr', 'eth', 'eur', 'jpy'], 
+        CURRENCIES, 
         index=0
     )
 
@@ -132,62 +449,39 @@ with st.sidebar:
 
     # Enhanced coin selection
     sorted_coins = sorted(df['name'])
-    selected_coin = st.multiselect(
-        'Select Cryptocurrencies', 
-        sorted_coins, 
-        default=sorted_coins[:10]  # Default to top 10 coins
-    )
+    # Filters live in a form so dragging the slider or picking coins only
+    # reruns the script once, on submit; currency stays outside as it drives the fetch
+    with st.form("filters"):
+        selected_coin = st.multiselect(
+            'Select Cryptocurrencies', 
+            sorted_coins, 
+            default=sorted_coins[:10]  # Default to top 10 coins
+        )
+
+        # Number of coins to display
+        num_coin = st.slider('Display Top N Coins', 1, MAX_COINS, 10)
 
-    # Number of coins to display
-    num_coin = st.slider('Display Top N Coins', 1, 100, 10)
+        st.form_submit_button("Update")
 
-# Filter selected coins
-df_selected_coin = df[df['name'].isin(selected_coin)].head(num_coin)
+# Filter selected coins; rows are already in market cap order, so keep the first num_coin matches
+selected = set(selected_coin)
+rows = [i for i, name in enumerate(df['name']) if name in selected][:num_coin]
+df_selected_coin = df.iloc[rows]
+
+# Nothing to show; stop before building the table and charts
+if df_selected_coin.empty:
+    st.warning("No cryptocurrencies selected.")
+    st.stop()
 
 # Display data summary
 st.subheader('Cryptocurrency Data Overview')
-st.write('Data Dimension: ' + str(df_selected_coin.shape[0]) + ' rows and ' + str(df_selected_coin.shape[1]) + ' columns.')
+n_rows, n_cols = df_selected_coin.shape
+st.write(f'Data Dimension: {n_rows} rows and {n_cols} columns.')
 
 # Display dataframe
 st.dataframe(df_selected_coin)
 
-# Bar Chart
-fig_bar = px.bar(df_selected_coin, x='name', y='current_price', title='Current Price of Selected Cryptocurrencies')
-st.plotly_chart(fig_bar)
-
-# Line Chart
-fig_line = px.line(df_selected_coin, x='name', y='market_cap', title='Market Cap of Selected Cryptocurrencies')
-st.plotly_chart(fig_line)
-
-# Histogram
-fig_hist = px.histogram(df_selected_coin, x='name', y='total_volume', title='Total Volume of Selected Cryptocurrencies')
-st.plotly_chart(fig_hist)
-
-# Pie Chart
-fig_pie = px.pie(
-    df_selected_coin, 
-    names='name', 
-    values='market_cap', 
-    title='Market Cap Distribution of Selected Cryptocurrencies',
-    color_discrete_sequence=px.colors.qualitative.Pastel
-)
-
-fig_pie.update_traces(textinfo='percent+label', pull=[0.1 if i < 3 else 0 for i in range(len(df_selected_coin))])
-fig_pie.update_layout(
-    showlegend=True,
-    legend=dict(
-        title="Cryptocurrencies",
-        orientation="v",
-        yanchor="top",
-        y=1,
-        xanchor="left",
-        x=1.05
-    )
-)
-st.plotly_chart(fig_pie)
-
-# Scatter Plot
-fig_scatter = px.scatter(df_selected_coin, x='name', y='price_change_percentage_24h', size='market_cap', color='name',
-                         title='24h Price Change Percentage vs Market Cap',
-                         hover_name='name', size_max=60)
-st.plotly_chart(fig_scatter)
\ No newline at end of file
+# Charts; theme=None renders each figure with its own layout instead of restyling
+# it in the browser with Streamlit's theme, and the mode bar is hidden
+for fig in build_charts(df_selected_coin):
+    st.plotly_chart(fig, use_container_width=True, theme=None, config={"displayModeBar": False})